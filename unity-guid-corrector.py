@@ -1,152 +1,415 @@
 import os
 import re
+import errno
+import hashlib
+import json
 import logging
-import time
+import mmap
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, FrozenSet, Iterator, List, Match, Optional, Tuple
 from tqdm import tqdm
 
+# Meta file reads are I/O-bound, so use more threads than cores
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Folders Unity, IDEs and git create at the project root; they never hold assets to correct.
+# Only skipped when the project path is the project root itself, since folders inside
+# Assets can have the same names.
+SKIPPED_PROJECT_DIRS = frozenset({'Library', 'Temp', 'Logs', 'obj', '.git', '.vs', '.idea'})
+
+# Target files handed to a worker process at a time
+REWRITE_CHUNK_SIZE = 32
+
+# Unity asset files that may reference script GUIDs
+TARGET_EXTENSIONS = ('.meta', '.unity', '.asset', '.prefab', '.mat')
+
+# Files discovered between progress updates while collecting target files
+SCAN_PROGRESS_STEP = 1000
+
+# Mappings from earlier runs, keyed by a fingerprint of both packages
+CACHE_DIR = Path.home() / '.cache' / 'unity-guid-corrector'
+
+# Bytes read from the start of a meta file before falling back to the whole file
+META_HEAD_SIZE = 4096
+_GUID_RE = re.compile(rb'guid:\s*([a-fA-F0-9]{32})')
+
+# A GUID reference in a serialized asset: exactly 32 lowercase hex digits. Scanning for
+# this one shape and looking tokens up costs the same however many GUIDs are mapped,
+# unlike an alternation of every mapped GUID, which re tries branch by branch.
+_GUID_TOKEN_RE = re.compile(rb'(?<![0-9a-fA-F])[0-9a-f]{32}(?![0-9a-fA-F])')
+
+def _walk(root, exts: Tuple[str, ...], skip_root_dirs: FrozenSet[str] = frozenset()) -> Iterator[str]:
+    """Yield paths of files under root whose names end with one of exts, skipping root's skip_root_dirs folders."""
+    for entry in _walk_entries(root, exts, skip_root_dirs):
+        yield entry.path
+
+def _walk_entries(root, exts: Tuple[str, ...], skip_root_dirs: FrozenSet[str] = frozenset()) -> Iterator[os.DirEntry]:
+    """Like _walk, but yield the DirEntry objects so callers can reuse their cached stat data."""
+    root = os.fspath(root)
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        skip_dirs = skip_root_dirs if current == root else frozenset()
+        try:
+            it = os.scandir(current)
+        except OSError as e:
+            # Skip unreadable folders the way Path.rglob does, but say so
+            logging.getLogger(__name__).warning(f"Skipping unreadable folder {current}: {e}")
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in skip_dirs:
+                        logging.getLogger(__name__).info(f"Skipping generated folder {entry.path}")
+                    else:
+                        stack.append(entry.path)
+                elif entry.name.endswith(exts):
+                    yield entry
+
+def _progress_options(total: int = 0) -> dict:
+    """Throttle progress bar refreshes so they stay cheap on large file sets."""
+    # disable=None turns the bar off when stderr is not a terminal
+    return dict(miniters=max(1, total // 200), mininterval=0.25, smoothing=0, disable=None)
+
+def _compile_guid_replacer(mapping_pairs: Tuple[Tuple[bytes, bytes], ...]) -> Tuple[Dict[bytes, bytes], Callable[[Match[bytes]], bytes]]:
+    """Build the GUID lookup and the callback that swaps mapped GUIDs, leaving others as they are."""
+    lookup = dict(mapping_pairs)
+    return lookup, lambda m: lookup.get(m[0], m[0])
+
+def _rewrite_guids(file_path: Path, lookup: Dict[bytes, bytes], guid_sub: Callable[[Match[bytes]], bytes]) -> bool:
+    """Replace mapped GUIDs in a file, returning whether it changed."""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Most files reference no mapped GUID; reject them before copying anything
+            if not any(m[0] in lookup for m in _GUID_TOKEN_RE.finditer(mm)):
+                return False
+            updated_content = _GUID_TOKEN_RE.sub(guid_sub, mm)
+    
+    # Update the target of a symlinked asset rather than replacing the link
+    target_path = file_path.resolve()
+    
+    # Swapping in a new file would get past a read-only flag, so refuse like a plain write would
+    if not os.access(target_path, os.W_OK):
+        raise PermissionError(errno.EACCES, "File is read-only", str(target_path))
+    
+    # Write to a fresh sibling file and swap it in so a failure never leaves a partial file
+    fd, temp_name = tempfile.mkstemp(dir=target_path.parent, prefix=target_path.name + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(updated_content)
+        shutil.copymode(target_path, temp_name)
+        os.replace(temp_name, target_path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    return True
+
+# Set in each worker process by _init_worker
+_worker_replacer: Optional[Tuple[Dict[bytes, bytes], Callable[[Match[bytes]], bytes]]] = None
+
+def _init_worker(mapping_pairs: Tuple[Tuple[bytes, bytes], ...]):
+    """Build the GUID replacer once per worker process."""
+    global _worker_replacer
+    _worker_replacer = _compile_guid_replacer(mapping_pairs)
+
+def _worker_rewrite_guids(file_path: Path) -> Tuple[bool, Optional[str]]:
+    """Rewrite a file in a worker process, returning the error instead of logging it."""
+    try:
+        return _rewrite_guids(file_path, *_worker_replacer), None
+    except Exception as e:
+        return False, str(e)
+
 class UnityGUIDCorrector:
     def __init__(self, decompiled_path: str, actual_path: str, project_path: str):
         self.decompiled_path = Path(decompiled_path)
         self.actual_path = Path(actual_path)
         self.project_path = Path(project_path)
         self.guid_mappings: Dict[str, str] = {}
+        self._decompiled_metas: Optional[List[Path]] = None
+        self._actual_metas: Optional[List[Path]] = None
+        self._meta_stats: Dict[Path, Tuple[int, int]] = {}
+        self._mapping_pairs: Tuple[Tuple[bytes, bytes], ...] = ()
         
-        # Configure logging
+        # Configure logging: the console gets progress messages, the log file
+        # also gets this tool's per-file details. Only this logger goes down to
+        # DEBUG, so other libraries stay at INFO.
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        file_handler = logging.FileHandler('guid_correction.log', delay=True)
+        file_handler.setLevel(logging.DEBUG)
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.StreamHandler(),
-                logging.FileHandler('guid_correction.log')
-            ]
+            handlers=[console_handler, file_handler]
         )
         self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging.DEBUG)
 
-    def count_files(self, path: Path, pattern: str) -> int:
-        """Count files matching a pattern in a directory."""
-        return len(list(path.rglob(pattern)))
+    def list_meta_files(self, path: Path) -> List[Path]:
+        """List all meta files under a package path, recording their stat data for the cache fingerprint."""
+        meta_files = []
+        for entry in _walk_entries(path, ('.meta',)):
+            meta = Path(entry.path)
+            meta_files.append(meta)
+            try:
+                # Comes with the directory listing on Windows; a single stat elsewhere
+                stat = entry.stat()
+                self._meta_stats[meta] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        return meta_files
+
+    def package_meta_files(self) -> Tuple[List[Path], List[Path]]:
+        """Return the decompiled and actual package meta files, listing them if validation has not."""
+        if self._decompiled_metas is None:
+            self._decompiled_metas = self.list_meta_files(self.decompiled_path)
+        if self._actual_metas is None:
+            self._actual_metas = self.list_meta_files(self.actual_path)
+        return self._decompiled_metas, self._actual_metas
 
     def validate_paths(self) -> bool:
         """Validate if all provided paths exist and are accessible."""
+        # Package meta file lists are kept for building the mappings; the
+        # project only needs one meta file to pass
         paths = [
-            (self.decompiled_path, "Decompiled package path"),
-            (self.actual_path, "Actual package path"),
-            (self.project_path, "Unity project path")
+            (self.decompiled_path, "Decompiled package path", True),
+            (self.actual_path, "Actual package path", True),
+            (self.project_path, "Unity project path", False)
         ]
         
         print("\n[1/4] Validating paths...")
-        time.sleep(0.5)  # Brief pause for readability
         
-        for path, description in paths:
+        package_metas = []
+        for path, description, keep_metas in paths:
             print(f"  Checking {description}...", end=' ')
             if not path.exists():
                 print("❌")
                 self.logger.error(f"{description} does not exist: {path}")
                 return False
-            if not any(path.rglob("*.meta")):
+            if not path.is_dir():
+                print("❌")
+                self.logger.error(f"{description} is not a folder: {path}")
+                return False
+            if keep_metas:
+                package_metas.append(self.list_meta_files(path))
+                has_metas = bool(package_metas[-1])
+            else:
+                has_metas = next(_walk(path, ('.meta',)), None) is not None
+            if not has_metas:
                 print("❌")
                 self.logger.error(f"No .meta files found in {description}: {path}")
                 return False
             print("✓")
-            time.sleep(0.2)  # Brief pause between checks
         
+        self._decompiled_metas, self._actual_metas = package_metas
         print("All paths validated successfully! ✓")
         return True
 
     def extract_guid_from_meta(self, meta_path: Path) -> Optional[str]:
         """Extract GUID from a meta file."""
         try:
-            content = meta_path.read_text()
-            guid_match = re.search(r'guid:\s*([a-fA-F0-9]{32})', content)
-            return guid_match.group(1).lower() if guid_match else None
+            # Raw descriptor reads skip the fstat/isatty calls a buffered open() makes,
+            # leaving open, read and close per meta file
+            fd = os.open(meta_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                # Unity writes the guid near the top, so usually the first block is enough.
+                # os.read may return less than asked for (e.g. on network shares), so
+                # keep reading until the block is full or the file ends.
+                content = b''
+                while len(content) < META_HEAD_SIZE:
+                    chunk = os.read(fd, META_HEAD_SIZE - len(content))
+                    if not chunk:
+                        break
+                    content += chunk
+                guid_match = _GUID_RE.search(content)
+                if not guid_match and len(content) == META_HEAD_SIZE:
+                    chunks = [content]
+                    while True:
+                        chunk = os.read(fd, META_HEAD_SIZE * 16)
+                        if not chunk:
+                            break
+                        chunks.append(chunk)
+                    guid_match = _GUID_RE.search(b''.join(chunks))
+            finally:
+                os.close(fd)
+            # Interned so a GUID read from several meta files is stored only once
+            return sys.intern(guid_match.group(1).decode('ascii').lower()) if guid_match else None
         except Exception as e:
             self.logger.error(f"Error reading meta file {meta_path}: {e}")
             return None
 
+    def pick_closest_meta(self, decompiled_meta: Path, candidates: List[Path]) -> Path:
+        """Pick the candidate whose folder layout best matches the decompiled meta file."""
+        if len(candidates) == 1:
+            return candidates[0]
+        
+        decompiled_parts = decompiled_meta.relative_to(self.decompiled_path).parent.parts[::-1]
+        
+        def shared_depth(candidate: Path) -> int:
+            candidate_parts = candidate.relative_to(self.actual_path).parent.parts[::-1]
+            depth = 0
+            for ours, theirs in zip(decompiled_parts, candidate_parts):
+                if ours != theirs:
+                    break
+                depth += 1
+            return depth
+        
+        return max(candidates, key=shared_depth)
+
+    def mappings_cache_path(self) -> Path:
+        """Return the cache file for this pair of packages."""
+        roots = b'\0'.join(os.fsencode(root.resolve()) for root in (self.decompiled_path, self.actual_path))
+        return CACHE_DIR / f"{hashlib.sha1(roots).hexdigest()}.json"
+
+    def packages_fingerprint(self) -> Optional[str]:
+        """Fingerprint the current state of both packages' meta files, or None if one can't be read."""
+        # Uses the stat data recorded while listing the packages, so no file is touched again
+        fingerprint = hashlib.sha1()
+        try:
+            for root, metas in zip((self.decompiled_path, self.actual_path), self.package_meta_files()):
+                fingerprint.update(os.fsencode(root.resolve()) + b'\0')
+                for meta_path in sorted(metas):
+                    stat = self._meta_stats.get(meta_path)
+                    if stat is None:
+                        self.logger.warning(f"Not using the mapping cache, could not stat {meta_path}")
+                        return None
+                    mtime_ns, size = stat
+                    fingerprint.update(os.fsencode(os.path.relpath(meta_path, root)))
+                    fingerprint.update(f":{mtime_ns}:{size}\0".encode())
+        except OSError as e:
+            self.logger.warning(f"Not using the mapping cache, could not fingerprint the package meta files: {e}")
+            return None
+        return fingerprint.hexdigest()
+
+    def load_cached_mappings(self, cache_path: Path, fingerprint: str) -> bool:
+        """Load GUID mappings from a previous run on the same package contents, if there is one."""
+        try:
+            cached = json.loads(cache_path.read_text())
+            if cached.get('fingerprint') != fingerprint:
+                return False
+            self.guid_mappings = {sys.intern(old): sys.intern(new) for old, new in cached['mappings'].items()}
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable mapping cache {cache_path}: {e}")
+            return False
+
+    def save_cached_mappings(self, cache_path: Path, fingerprint: str):
+        """Save GUID mappings so later runs on unchanged packages can skip the scan."""
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_text(json.dumps({'fingerprint': fingerprint, 'mappings': self.guid_mappings}))
+        except Exception as e:
+            self.logger.warning(f"Could not write mapping cache {cache_path}: {e}")
+
     def build_guid_mappings(self):
         """Build mappings between decompiled and actual package GUIDs."""
         print("\n[2/4] Building GUID mappings...")
-        time.sleep(0.5)
         
-        # Count total files for progress bar
-        decompiled_meta_files = list(self.decompiled_path.rglob("*.meta"))
-        print(f"\nFound {len(decompiled_meta_files)} meta files in decompiled package")
+        # One cache entry per pair of packages, overwritten whenever their meta files change
+        cache_path = self.mappings_cache_path()
+        fingerprint = self.packages_fingerprint()
+        if fingerprint and self.load_cached_mappings(cache_path, fingerprint):
+            print(f"\nLoaded {len(self.guid_mappings)} GUID mappings from cache ({cache_path})")
+        else:
+            self.scan_guid_mappings()
+            if fingerprint:
+                self.save_cached_mappings(cache_path, fingerprint)
+        
+        # Encode the mappings once; GUIDs that map to themselves are left out
+        # since replacing them changes nothing
+        self._mapping_pairs = tuple(
+            (old.encode('ascii'), new.encode('ascii'))
+            for old, new in self.guid_mappings.items() if old != new
+        )
+        
+        already_matching = len(self.guid_mappings) - len(self._mapping_pairs)
+        if already_matching:
+            print(f"Skipping {already_matching} GUIDs that already match the actual package")
+        print(f"Found {len(self._mapping_pairs)} GUID mappings! ✓")
+
+    def scan_guid_mappings(self):
+        """Pair decompiled and actual meta files by name and map their GUIDs."""
+        decompiled_meta_files, actual_meta_files = self.package_meta_files()
+        decompiled_count = len(decompiled_meta_files)
+        print(f"\nFound {decompiled_count} meta files in decompiled package")
         
         # Print first few decompiled meta files for verification
         print("\nSample decompiled meta files:")
-        for meta in list(decompiled_meta_files)[:5]:
+        for meta in decompiled_meta_files[:5]:
             print(f"  - {meta.relative_to(self.decompiled_path)}")
         
         # Print first few actual package meta files for verification
         print("\nSample actual package meta files:")
-        actual_meta_files = list(self.actual_path.rglob("*.meta"))[:5]
-        for meta in actual_meta_files:
+        for meta in actual_meta_files[:5]:
             print(f"  - {meta.relative_to(self.actual_path)}")
         
-        with tqdm(total=len(decompiled_meta_files), desc="  Analyzing meta files", 
-                 bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} files') as pbar:
-            
-            for decompiled_meta in decompiled_meta_files:
-                try:
-                    filename = decompiled_meta.stem
-                    
-                    # Find corresponding meta file in actual package
-                    actual_meta = None
-                    for potential_meta in self.actual_path.rglob(f"{filename}.meta"):
-                        if potential_meta.exists():
-                            actual_meta = potential_meta
-                            break
-                    
-                    if actual_meta:
-                        decompiled_guid = self.extract_guid_from_meta(decompiled_meta)
-                        actual_guid = self.extract_guid_from_meta(actual_meta)
-                        
-                        if decompiled_guid and actual_guid:
-                            self.guid_mappings[decompiled_guid] = actual_guid
-                            self.logger.info(f"Mapped {filename}: {decompiled_guid} -> {actual_guid}")
-                    
-                except Exception as e:
-                    self.logger.error(f"Error processing {decompiled_meta}: {e}")
-                
-                pbar.update(1)
+        # Index actual package meta files by name for constant-time lookup
+        actual_index: Dict[str, List[Path]] = {}
+        for meta in actual_meta_files:
+            actual_index.setdefault(meta.stem, []).append(meta)
         
-        print(f"Found {len(self.guid_mappings)} GUID mappings! ✓")
-
-    def replace_guids_in_file(self, file_path: Path) -> bool:
-        """Replace GUIDs in a single file."""
-        try:
-            content = file_path.read_text()
-            original_content = content
-            
-            for old_guid, new_guid in self.guid_mappings.items():
-                content = content.replace(old_guid, new_guid)
-            
-            if content != original_content:
-                file_path.write_text(content)
-                self.logger.info(f"Updated GUIDs in {file_path}")
-                return True
+        def map_meta_file(decompiled_meta: Path) -> Optional[Tuple[str, str, str]]:
+            try:
+                filename = decompiled_meta.stem
                 
-        except Exception as e:
-            self.logger.error(f"Error updating {file_path}: {e}")
+                # Find corresponding meta file in actual package
+                candidates = actual_index.get(filename)
+                actual_meta = self.pick_closest_meta(decompiled_meta, candidates) if candidates else None
+                
+                if actual_meta:
+                    decompiled_guid = self.extract_guid_from_meta(decompiled_meta)
+                    actual_guid = self.extract_guid_from_meta(actual_meta)
+                    
+                    if decompiled_guid and actual_guid:
+                        return filename, decompiled_guid, actual_guid
+                
+            except Exception as e:
+                self.logger.error(f"Error processing {decompiled_meta}: {e}")
             
-        return False
+            return None
+        
+        # Read meta files concurrently, but only touch guid_mappings from this thread
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = executor.map(map_meta_file, decompiled_meta_files)
+            for result in tqdm(results, total=decompiled_count, desc="  Analyzing meta files",
+                               bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} files',
+                               **_progress_options(decompiled_count)):
+                if result:
+                    filename, decompiled_guid, actual_guid = result
+                    self.guid_mappings[decompiled_guid] = actual_guid
+                    self.logger.debug(f"Mapped {filename}: {decompiled_guid} -> {actual_guid}")
+        
+        self.logger.info(f"Mapped {len(self.guid_mappings)} GUIDs from {decompiled_count} decompiled meta files")
 
     def collect_target_files(self) -> list:
         """Collect all files that need to be processed."""
         print("\n[3/4] Collecting files to process...")
-        time.sleep(0.5)
         
         target_files = []
-        extensions = ['.meta', '.unity', '.asset', '.prefab', '.mat']
         
-        with tqdm(total=len(extensions), desc="  Scanning directories", 
-                 bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} extensions') as pbar:
-            for ext in extensions:
-                files = list(self.project_path.rglob(f"*{ext}"))
-                target_files.extend(files)
-                pbar.update(1)
+        # A Unity project root holds both Assets and ProjectSettings; anything else,
+        # such as the Assets folder itself, is walked in full
+        is_project_root = (self.project_path / 'Assets').is_dir() and (self.project_path / 'ProjectSettings').is_dir()
+        skip_dirs = SKIPPED_PROJECT_DIRS if is_project_root else frozenset()
+        
+        with tqdm(desc="  Scanning directories", 
+                 bar_format='{l_bar}{bar}| {n_fmt} files', **_progress_options()) as pbar:
+            for file_path in _walk(self.project_path, TARGET_EXTENSIONS, skip_dirs):
+                target_files.append(Path(file_path))
+                if len(target_files) % SCAN_PROGRESS_STEP == 0:
+                    pbar.update(SCAN_PROGRESS_STEP)
+            pbar.update(len(target_files) % SCAN_PROGRESS_STEP)
         
         print(f"Found {len(target_files)} files to process! ✓")
         return target_files
@@ -162,22 +425,35 @@ class UnityGUIDCorrector:
             print("\n❌ No GUID mappings found. Ensure the paths are correct.")
             self.logger.error("No GUID mappings found. Ensure the paths are correct.")
             return 0, 0
+        
+        if not self._mapping_pairs:
+            print("\n✓ All mapped GUIDs already match the actual package. Nothing to correct.")
+            self.logger.info(f"All {len(self.guid_mappings)} mapped GUIDs already match the actual package")
+            return 0, 0
 
         target_files = self.collect_target_files()
         files_processed = 0
         files_modified = 0
         
         print("\n[4/4] Correcting GUIDs...")
-        time.sleep(0.5)
         
-        with tqdm(total=len(target_files), desc="  Updating files",
-                 bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} files') as pbar:
-            for file_path in target_files:
+        # Large scenes make the rewrite CPU-bound, so spread it across processes
+        # The default worker count is one per core, capped where the platform requires it
+        with ProcessPoolExecutor(initializer=_init_worker, initargs=(self._mapping_pairs,)) as executor:
+            results = executor.map(_worker_rewrite_guids, target_files, chunksize=REWRITE_CHUNK_SIZE)
+            for file_path, (modified, error) in tqdm(zip(target_files, results), total=len(target_files),
+                                                     desc="  Updating files",
+                                                     bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} files',
+                                                     **_progress_options(len(target_files))):
                 files_processed += 1
-                if self.replace_guids_in_file(file_path):
+                if error:
+                    self.logger.error(f"Error updating {file_path}: {error}")
+                elif modified:
                     files_modified += 1
-                pbar.update(1)
+                    self.logger.debug(f"Updated GUIDs in {file_path}")
 
+        self.logger.info(f"Updated GUIDs in {files_modified} of {files_processed} files")
+        
         print(f"\nOperation completed successfully! ✓")
         print(f"Files processed: {files_processed}")
         print(f"Files modified: {files_modified}")